@@ -1,10 +1,20 @@
-from collections import defaultdict
-from functools import lru_cache, partial
+import asyncio
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import time
-from urllib.request import urlopen
 from urllib.parse import urljoin, urlparse, urlunparse, urlencode
+import aiohttp
+import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+import io
 import json
+import ijson
+import orjson
+import queue
 import sqlite3
+import threading
 from contextlib import closing
 import traceback
 from typing import Optional, Mapping, Sequence, Any, Callable, Dict, Tuple, Type, TypeVar, List, Set, Generator, Iterable
@@ -59,21 +69,126 @@ from typing import Optional, Mapping, Sequence, Any, Callable, Dict, Tuple, Type
 # The operator module contains a set of functions corresponding to Python’s operators.
 # The functools module contains some higher-order functions e.g. the functools.partial(), .reduce() functions.
 
+# One Session for the whole module so keep-alive reuses the same TCP+TLS
+# connection across the hundreds of paginated requests a crawl makes; a
+# fresh handshake per request dominated wall time before...
+# The CachedSession adds an HTTP-level layer under the parsed-tuple cache of
+# sqlite_memoize: pageid/title data rarely changes between crawls, so repeat
+# queries are served from tropes_http.sqlite (or as a ~200 byte 304 when the
+# server honours the revalidation headers) instead of re-sending the JSON...
+
+# Nota bene: MediaWiki reports maxlag and friends as an HTTP 200 JSON body
+# with an 'error' key; caching one of those for a day would replay the same
+# failure on every retry, so refuse to store them...
+def _cacheable(response) -> bool:
+    try:
+        return 'error' not in orjson.loads(response.content)
+    except Exception:
+        return True
+
+_SESSION = requests_cache.CachedSession('tropes_http.sqlite', backend='sqlite',
+                                        expire_after=86400, allowable_methods=('GET',),
+                                        filter_fn=_cacheable)
+_SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=20))
+_SESSION.headers.update({'User-Agent': 'tropes_galore/1.0', 'Accept-Encoding': 'gzip'})
+
+# The per-page category_page lookups are independent blocking round-trips and
+# the GIL is released during I/O, so fan them out over a small pool that
+# shares the keep-alive sockets of _SESSION; cache hits short-circuit cheaply.
+_POOL = ThreadPoolExecutor(max_workers=8)
+
 Page = Tuple[int, str]
 Pages = Set[Page]
-Members = Mapping[Page, Pages]
+# Structure-of-Arrays batches: a (id, title) tuple costs ~80 bytes on CPython,
+# which is >100 MB of overhead on a full crawl, so a batch is four int64 id
+# columns (array('q')) with the titles interned once in _titles by pageid.
+# The two membership columns are aligned index-wise.
+Batch = Tuple[array, array, array, array] # (trope_ids, category_ids, membership_category_ids, membership_member_ids)
+_titles: Dict[int, str] = {}
+
+# A lambda + removeprefix per category per page is ~4 interpreter dispatches
+# each, ~10k per 500-page batch; a conditional slice in a comprehension does
+# the same work without the call overhead...
+_PREFIX = 'Category:'
+_PREFIX_LEN = len(_PREFIX)
+
+# Category titles repeat constantly across pages; a title-keyed dict in front
+# of category_page skips even the key construction and lock of the sqlite
+# cache, and None entries double as a negative cache. Nota bene: keyed on the
+# title alone since everything talks to the one wiki; for a truly huge title
+# space this could become a pybloom_live.ScalableBloomFilter over the titles
+# to cap memory at a few MB...
+_seen_titles: Dict[str, Optional[Page]] = {}
 
 # Generator[YieldType, SendType, ReturnType]
 # Iterable[YieldType]
 
-@lru_cache(maxsize=None)
-def site_maintenance_pages() -> Pages:
-    pages = set()
-    for members in category_members(category='Site Maintenance', gcmlimit=100, max_members=None):
-        pages.update(members.keys())
-    return pages
+# lru_cache dies with the process, so every restart re-issued thousands of
+# allcategories requests for titles seen in a previous run. Persist the
+# (args -> page) mapping in the existing tropes.db, with an unbounded dict in
+# front so hot lookups never touch SQLite. None results are persisted too,
+# as NULL columns, so known-missing categories are not re-fetched either...
+def sqlite_memoize(db: str = "tropes.db", table: str = "category_page_cache"):
+    def decorator(function: Callable[..., Optional[Page]]) -> Callable[..., Optional[Page]]:
+        memory: Dict[str, Optional[Page]] = {}
+        lock = threading.Lock()
+        # Nota bene: The wrapped function is called from _POOL threads, so the
+        # connection is shared under a lock rather than per-thread...
+        connection = sqlite3.connect(db, check_same_thread=False)
+        connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, pageid INTEGER, title TEXT)")
+        connection.commit()
 
-@lru_cache(maxsize=None)
+        def wrapper(*args, **kwargs) -> Optional[Page]:
+            key = repr((args, tuple(sorted(kwargs.items()))))
+            if key in memory:
+                return memory[key]
+            with lock:
+                row = connection.execute(f"SELECT pageid, title FROM {table} WHERE key=?", (key,)).fetchone()
+            if row != None:
+                page = (row[0], row[1]) if row[0] != None else None
+                memory[key] = page
+                return page
+            page = function(*args, **kwargs)
+            with lock:
+                connection.execute(f"INSERT OR REPLACE INTO {table}(key, pageid, title) VALUES(?, ?, ?)",
+                                   (key, page[0] if page != None else None, page[1] if page != None else None))
+                connection.commit()
+            memory[key] = page
+            return page
+
+        # Callers that already hold a (pageid, title) can stuff it into the
+        # cache up front and save the wrapped call entirely...
+        def seed(page: Optional[Page], *args, **kwargs) -> None:
+            key = repr((args, tuple(sorted(kwargs.items()))))
+            if key in memory:
+                return
+            memory[key] = page
+            with lock:
+                connection.execute(f"INSERT OR IGNORE INTO {table}(key, pageid, title) VALUES(?, ?, ?)",
+                                   (key, page[0] if page != None else None, page[1] if page != None else None))
+                connection.commit()
+
+        # A read-only probe: answers from the dict or the table but never
+        # triggers the wrapped HTTP call, for callers (the async path) that
+        # must not block the event loop on a miss...
+        def lookup(*args, **kwargs) -> Tuple[bool, Optional[Page]]:
+            key = repr((args, tuple(sorted(kwargs.items()))))
+            if key in memory:
+                return (True, memory[key])
+            with lock:
+                row = connection.execute(f"SELECT pageid, title FROM {table} WHERE key=?", (key,)).fetchone()
+            if row != None:
+                page = (row[0], row[1]) if row[0] != None else None
+                memory[key] = page
+                return (True, page)
+            return (False, None)
+
+        wrapper.seed = seed
+        wrapper.lookup = lookup
+        return wrapper
+    return decorator
+
+@sqlite_memoize(db="tropes.db", table="category_page_cache")
 def category_page(category: str,
             scheme: str = 'https', 
             net_loc: str = 'allthetropes.org', 
@@ -90,30 +205,59 @@ def category_page(category: str,
     }
     
     url = urlunparse((scheme, net_loc, path, None, urlencode(query_params), None))
-    with urlopen(url) as response:
-        utf8 = response.read().decode('utf8')
-        dict = json.loads(utf8)
-        if ((query := dict.get('query', None)) != None and 
-            (pages := query.get('pages', None)) != None and 
-            (page := (pages[0] if len(pages) == 1 else None)) != None and
-            (page.get('missing', None)) == None):
-            #print(f"{category}, {scheme}, {net_loc}, {path} -> (page['pageid'], page['title'])")
-            return (page['pageid'], page['title'])
-        else:
-            return None
+    # orjson takes the raw bytes directly, skipping the utf8 decode and the
+    # pure-Python parse of stdlib json...
+    payload = orjson.loads(_SESSION.get(url, timeout=30).content)
+    # Nota bene: maxlag and friends come back as HTTP 200 with an 'error'
+    # body; falling through to the None branch would have sqlite_memoize
+    # persist a NULL tombstone for a category that really exists, so raise
+    # before the memoize layer can see a result. Only a genuine
+    # 'query'-bearing miss below is a real "known missing"...
+    if (error := payload.get('error', None)) != None:
+        raise RuntimeError(f"category_page('{category}'): {error}")
+    if ((query := payload.get('query', None)) != None and
+        (pages := query.get('pages', None)) != None and
+        (page := (pages[0] if len(pages) == 1 else None)) != None and
+        (page.get('missing', None)) == None):
+        #print(f"{category}, {scheme}, {net_loc}, {path} -> (page['pageid'], page['title'])")
+        return (page['pageid'], page['title'])
+    else:
+        return None
+
+# A gcmlimit=500 response with full 'categories' props runs to multiple MB and
+# orjson would materialize the whole tree before we touch a single page. One
+# pass over the ijson event stream instead: each query.pages item is built and
+# yielded as it is decoded, never holding the full tree, and the top-level
+# batchcomplete / continue / error values are recorded into meta on the way
+# past...
+def _stream_query(stream, meta: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+    builder = None
+    for prefix, event, value in ijson.parse(stream):
+        if prefix == 'query.pages.item' and event == 'start_map':
+            builder = ijson.ObjectBuilder()
+        if builder != None:
+            builder.event(event, value)
+            if prefix == 'query.pages.item' and event == 'end_map':
+                yield builder.value
+                builder = None
+        elif prefix == 'batchcomplete':
+            meta['batchcomplete'] = value
+        elif prefix.startswith('continue.') and event in ('string', 'number'):
+            meta.setdefault('continue', {})[prefix.removeprefix('continue.')] = value
+        elif prefix.startswith('error.') and event in ('string', 'number'):
+            meta[prefix] = value
 
 # Nota bene: The larger the 'limit' (10 - 500), the more memory is used, and fewer requests are made.
 # The size of each 'batch' depends on the association of category members to categories, category
 # members belonging to many categories which trigger more continues before the batch is complete.
 
 def category_members(category: str,
-                     exclude_pages: Pages = set(),
                      max_members: int = None,
                      gcmlimit: int = 50,
                      cllimit: int = 20,
                      scheme: str = 'https', 
                      net_loc: str = 'allthetropes.org', 
-                     path: str = 'w/api.php/') -> Generator[Members, None, None]:
+                     path: str = 'w/api.php/') -> Generator[Batch, None, None]:
 
     if max_members != None and max_members <= 0:
         max_members = None
@@ -148,6 +292,7 @@ def category_members(category: str,
         'gcmlimit': gcmlimit, # 'max', # or 1 - 500
         'gcmtype': 'subcat|page',
         'prop': 'categories', # limit the result with clcategories=Category:Ending Tropes|Category:Tropes|Category:Twist Ending
+        'clshow': '!hidden', # Site Maintenance categories are hidden, so filter them in the MediaWiki SQL layer...
         'cllimit': cllimit,
         'maxlag': 1
     }
@@ -161,239 +306,369 @@ def category_members(category: str,
     # a bare return statement, or simply returning from the function, indicates that it is done...
     
     category_page_ = partial(category_page, scheme=scheme, net_loc=net_loc, path=path)
-    
-    members = defaultdict(set)
-    while max_members == None or num_members < max_members:        
-        url = urlunparse((scheme, net_loc, path, None, urlencode(query_params), None))
-        with urlopen(url) as response:
-            utf8 = response.read().decode('utf8')
-            dict = json.loads(utf8)
-            if ((query := dict.get('query', None)) != None and 
-                (pages := query.get('pages', None)) != None):
-                for page in pages:
-                    category_titles = map(lambda category: category['title'].removeprefix('Category:'), page.get('categories', []))
-                    categories = set(map(category_page_, category_titles))
-                    categories.discard(None)
-                    members[(page['pageid'], page['title'])].update(categories.difference(exclude_pages))
-                    #print(f"{(page['pageid'], page['title'])} {members[(page['pageid'], page['title'])]}")
-            else:
-                print(dict)
-            if dict.get('batchcomplete', None) == True:
-                num_members += len(members)
-                print(f'batchcomplete...{len(members)} members of {num_members} total')
-                yield members
-                members.clear()
-
-            if (continue_value := dict.get('continue', None)) == None:
-                return
 
-            print(f'continue...{len(members)} members {continue_value}')
-            # Nota bene: Need to remove previous continue items as they can switch
-            # from e.g. lhcontinue to gcmcontinue when combining props with generator...
-            query_params = {k: v for k, v in query_params.items() if not k.endswith('continue')}
-            query_params.update(continue_value)
-
-# TODO: Can one fake a continue?
-# TODO: Maybe use cmsort=sortkey together with gcmstarthexsortkey?
-def upsert_category_members(members: Members, database: str = "tropes.db", category: str = 'Trope'):
-    with closing(sqlite3.connect(database)) as connection:
-        create_tropes = "CREATE TABLE IF NOT EXISTS tropes (id INTEGER PRIMARY KEY, title TEXT)"
-        create_categories = "CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, title TEXT)"
-        create_members = """CREATE TABLE IF NOT EXISTS members (
-                            category_id INTEGER, 
-                            member_id INTEGER, 
-                            PRIMARY KEY (category_id, member_id),
-                            FOREIGN KEY (category_id) REFERENCES categories(id),
-                            FOREIGN KEY (member_id) REFERENCES tropes(id))"""
-        upsert_category = """INSERT INTO categories(id, title) VALUES(?, ?) 
-                            ON CONFLICT(id) DO UPDATE SET title=title;"""
-        upsert_trope = """INSERT INTO tropes(id, title) VALUES(?, ?) 
-                            ON CONFLICT(id) DO UPDATE SET title=title;"""
-        upsert_membership = """INSERT INTO members(category_id, member_id) VALUES(?, ?) 
-                                ON CONFLICT(category_id, member_id) DO NOTHING;"""
-
-        cursor = connection.cursor()
-
-        cursor.execute(create_tropes)
-        cursor.execute(create_categories)
-        cursor.execute(create_members)
-
-        for ((member_id, member_title), categories) in members.items():
-            # Nota bene: Bound parameters handle apostrophes and quotation marks in values...
-            if member_title.startswith('Category:'):
-                cursor.execute(upsert_category, (member_id, member_title.removeprefix('Category:')))
+    # Nota bene: LOAD_FAST beats LOAD_GLOBAL + LOAD_ATTR, and the loop below
+    # runs millions of lookups over a full crawl, so hoist the hot names...
+    _urlencode = urlencode
+    _session_get = _SESSION.get
+    _pool_map = _POOL.map
+    _seed = category_page.seed
+    titles = _titles
+    seen = _seen_titles
+
+    # The only consumer feeds SQLite, whose keys dedup anyway, so accumulate
+    # flat id columns instead of hashing a set per page; batch_ids only keeps
+    # the member accounting honest across prop-continues...
+    trope_ids = array('q')
+    category_ids = array('q')
+    membership_category_ids = array('q')
+    membership_member_ids = array('q')
+    batch_ids = set()
+
+    # Everything except the continuation is fixed for the whole crawl, so
+    # percent-encode the 14-odd parameters once up front; each iteration only
+    # appends the handful of continue keys...
+    base_url = f'{scheme}://{net_loc}/{path}?{_urlencode(query_params)}'
+    continue_params: Dict[str, Any] = {}
+
+    while max_members == None or num_members < max_members:
+        url = base_url + '&' + _urlencode(continue_params) if continue_params else base_url
+        # Nota bene: A CachedResponse from requests_cache does not replay its
+        # body through .raw, so streaming off the socket here made ijson die
+        # with a premature EOF on every repeat crawl served from
+        # tropes_http.sqlite. Parse incrementally from the materialized bytes
+        # instead; still one pass, and it works for live and cached responses
+        # alike...
+        content = _session_get(url, timeout=30).content
+        meta: Dict[str, Any] = {}
+        num_pages = 0
+        for page in _stream_query(io.BytesIO(content), meta):
+            num_pages += 1
+            pageid = page['pageid']
+            title = page['title']
+            # A page that shows up as a member in this batch is very likely
+            # queried as a category later; we already hold its pageid, so
+            # seed the cache instead of throwing it away...
+            if title.startswith(_PREFIX):
+                stripped = title[_PREFIX_LEN:]
+                _seed((pageid, title), stripped,
+                                   scheme=scheme, net_loc=net_loc, path=path)
+                seen[stripped] = (pageid, title)
+                category_ids.append(pageid)
+                titles[pageid] = stripped
             else:
-                cursor.execute(upsert_trope, (member_id, member_title))
-
+                trope_ids.append(pageid)
+                titles[pageid] = title
+            batch_ids.add(pageid)
+            category_titles = [t[_PREFIX_LEN:] if t.startswith(_PREFIX) else t
+                               for t in (category['title'] for category in page.get('categories', []))]
+            # Probably-known titles short-circuit here; only genuinely new
+            # ones pay the pool dispatch and cache machinery...
+            categories = {seen[t] for t in category_titles if t in seen}
+            unknown = [t for t in category_titles if t not in seen]
+            for (t, category) in zip(unknown, _pool_map(category_page_, unknown)):
+                seen[t] = category
+                categories.add(category)
+            categories.discard(None)
             for (category_id, category_title) in categories:
-                #print(f'{(category_id, category_title)} {(category_id, member_id)}')
-                cursor.execute(upsert_category, (category_id, category_title.removeprefix('Category:')))
-                cursor.execute(upsert_membership, (category_id, member_id))
+                #print(f'{(category_id, category_title)} {(category_id, pageid)}')
+                category_ids.append(category_id)
+                titles[category_id] = category_title[_PREFIX_LEN:] if category_title.startswith(_PREFIX) else category_title
+                membership_category_ids.append(category_id)
+                membership_member_ids.append(pageid)
+        if num_pages == 0 and meta.get('batchcomplete', None) == None:
+            print(meta) # maxlag and friends...
+        if meta.get('batchcomplete', None) == True:
+            num_members += len(batch_ids)
+            print(f'batchcomplete...{len(batch_ids)} members of {num_members} total')
+            yield (trope_ids, category_ids, membership_category_ids, membership_member_ids)
+            trope_ids = array('q')
+            category_ids = array('q')
+            membership_category_ids = array('q')
+            membership_member_ids = array('q')
+            batch_ids.clear()
+
+        if (continue_value := meta.get('continue', None)) == None:
+            return
+
+        print(f'continue...{len(batch_ids)} members {continue_value}')
+        # Nota bene: The continue items can switch from e.g. lhcontinue to
+        # gcmcontinue when combining props with a generator, so the whole
+        # continuation is replaced rather than merged...
+        continue_params = continue_value
+
+# Opening a connection, re-applying the PRAGMAs and re-parsing the CREATEs
+# once per batch added up over the hundreds of batches of a Trope crawl; the
+# writers now take a connection opened once here and closed once by the
+# caller. WAL also lets the show_* readers run while a crawl is writing...
+def _open_db(database: str = "tropes.db", check_same_thread: bool = True) -> sqlite3.Connection:
+    connection = sqlite3.connect(database, check_same_thread=check_same_thread)
+    # WAL + NORMAL sync drops the per-commit fsync cost; a crawl can always
+    # be re-run so we don't need the durability of FULL here...
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA temp_store=MEMORY")
+
+    create_tropes = "CREATE TABLE IF NOT EXISTS tropes (id INTEGER PRIMARY KEY, title TEXT)"
+    create_categories = "CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, title TEXT)"
+    create_members = """CREATE TABLE IF NOT EXISTS members (
+                        category_id INTEGER,
+                        member_id INTEGER,
+                        PRIMARY KEY (category_id, member_id),
+                        FOREIGN KEY (category_id) REFERENCES categories(id),
+                        FOREIGN KEY (member_id) REFERENCES tropes(id))"""
+    # The PRIMARY KEY already serves category_id seeks; member_id needs its
+    # own index for the NOT EXISTS roots and the upward joins...
+    create_members_mem_idx = "CREATE INDEX IF NOT EXISTS members_mem_idx ON members(member_id)"
+
+    connection.execute(create_tropes)
+    connection.execute(create_categories)
+    connection.execute(create_members)
+    connection.execute(create_members_mem_idx)
+    return connection
 
+# TODO: Can one fake a continue?
+# TODO: Maybe use cmsort=sortkey together with gcmstarthexsortkey?
+def upsert_category_members(batch: Batch, connection: sqlite3.Connection, category: str = 'Trope'):
+    # Even executemany re-enters the SQLite VM once per row; handing the
+    # whole batch over as one JSON array lets the C-side json_each parser
+    # drive the insert in a single statement...
+    # Nota bene: WHERE true disambiguates the ON CONFLICT clause from a join.
+    upsert_categories = """INSERT INTO categories(id, title)
+                        SELECT value->>0, value->>1 FROM json_each(?) WHERE true
+                        ON CONFLICT(id) DO UPDATE SET title=excluded.title;"""
+    upsert_tropes = """INSERT INTO tropes(id, title)
+                        SELECT value->>0, value->>1 FROM json_each(?) WHERE true
+                        ON CONFLICT(id) DO UPDATE SET title=excluded.title;"""
+    upsert_memberships = """INSERT OR IGNORE INTO members(category_id, member_id)
+                            SELECT value->>0, value->>1 FROM json_each(?);"""
+
+    cursor = connection.cursor()
+
+    # Nota bene: Bound parameters handle apostrophes and quotation marks in values...
+    trope_ids, category_ids, membership_category_ids, membership_member_ids = batch
+
+    connection.execute("BEGIN")
+    cursor.execute(upsert_tropes, (json.dumps([(id, _titles[id]) for id in trope_ids]),))
+    cursor.execute(upsert_categories, (json.dumps([(id, _titles[id]) for id in category_ids]),))
+    cursor.execute(upsert_memberships, (json.dumps(list(zip(membership_category_ids, membership_member_ids))),))
+
+    connection.commit()
+
+# The PRIMARY KEY (category_id, member_id) on members forces a B-tree update
+# per inserted row. For a multi-batch load it is cheaper to land everything in
+# an index-free stage table and fold it into members with one bulk sort at the
+# end; upsert_category_members stays for incremental single batches...
+def bulk_load_category_members(batches: Iterable[Batch], connection: sqlite3.Connection):
+    create_stage = "CREATE TABLE members_stage (category_id INTEGER, member_id INTEGER)"
+
+    upsert_categories = """INSERT INTO categories(id, title)
+                        SELECT value->>0, value->>1 FROM json_each(?) WHERE true
+                        ON CONFLICT(id) DO UPDATE SET title=excluded.title;"""
+    upsert_tropes = """INSERT INTO tropes(id, title)
+                        SELECT value->>0, value->>1 FROM json_each(?) WHERE true
+                        ON CONFLICT(id) DO UPDATE SET title=excluded.title;"""
+    stage_memberships = """INSERT INTO members_stage(category_id, member_id)
+                            SELECT value->>0, value->>1 FROM json_each(?);"""
+
+    cursor = connection.cursor()
+
+    cursor.execute("DROP TABLE IF EXISTS members_stage")
+    cursor.execute(create_stage)
+
+    for (trope_ids, category_ids, membership_category_ids, membership_member_ids) in batches:
+        connection.execute("BEGIN")
+        cursor.execute(upsert_tropes, (json.dumps([(id, _titles[id]) for id in trope_ids]),))
+        cursor.execute(upsert_categories, (json.dumps([(id, _titles[id]) for id in category_ids]),))
+        cursor.execute(stage_memberships, (json.dumps(list(zip(membership_category_ids, membership_member_ids))),))
         connection.commit()
 
+    connection.execute("BEGIN")
+    # _open_db creates members_mem_idx for the incremental path and the
+    # readers, so drop it for the fold and rebuild it afterwards in one bulk
+    # sort -- otherwise every folded row would pay its maintenance...
+    cursor.execute("DROP INDEX IF EXISTS members_mem_idx")
+    cursor.execute("INSERT OR IGNORE INTO members SELECT DISTINCT * FROM members_stage")
+    cursor.execute("DROP TABLE members_stage")
+    cursor.execute("CREATE INDEX IF NOT EXISTS members_mem_idx ON members(member_id)")
+    connection.commit()
+
+
+# The show_* helpers are typically called over and over from a REPL; opening a
+# fresh connection per call threw away sqlite3's internal statement cache and
+# the page cache, so the expensive recursive CTE plans were re-prepared every
+# time. One long-lived connection per database path instead...
+_CONNECTIONS: Dict[str, sqlite3.Connection] = {}
+
+def _get_conn(database: str) -> sqlite3.Connection:
+    connection = _CONNECTIONS.get(database, None)
+    if connection == None:
+        connection = sqlite3.connect(database, cached_statements=256)
+        connection.execute("PRAGMA cache_size=-65536") # 64 MB of page cache so the CTEs don't re-read from disk...
+        _CONNECTIONS[database] = connection
+    return connection
 
 def show_categories(database: str = "tropes.db"):
-    with closing(sqlite3.connect(database)) as connection:
-        select = """
-        SELECT id, title, (SELECT COUNT(1) FROM members WHERE category_id = id)
-        FROM categories
-        ;"""
-        cursor = connection.cursor()
-        cursor.execute(select)
-        rows = cursor.fetchall()
-        print(list(map(lambda x: x[0], cursor.description)))
-        for row in rows:
-            print(row)
-        print(f'Fetched {len(rows)} rows...')  
+    connection = _get_conn(database)
+    select = """
+    SELECT id, title, (SELECT COUNT(1) FROM members WHERE category_id = id)
+    FROM categories
+    ;"""
+    cursor = connection.cursor()
+    cursor.execute(select)
+    rows = cursor.fetchall()
+    print(list(map(lambda x: x[0], cursor.description)))
+    for row in rows:
+        print(row)
+    print(f'Fetched {len(rows)} rows...')  
 
 def show_tropes(database: str = "tropes.db"):
-    with closing(sqlite3.connect(database)) as connection:
-        select = """SELECT id, title FROM tropes;"""
-        cursor = connection.cursor()
-        cursor.execute(select)
-        rows = cursor.fetchall()
-        print(list(map(lambda x: x[0], cursor.description)))
-        for index, row in enumerate(rows):
-            print(row)          
-        print(f'Fetched {len(rows)} rows...')  
+    connection = _get_conn(database)
+    select = """SELECT id, title FROM tropes;"""
+    cursor = connection.cursor()
+    cursor.execute(select)
+    rows = cursor.fetchall()
+    print(list(map(lambda x: x[0], cursor.description)))
+    for index, row in enumerate(rows):
+        print(row)          
+    print(f'Fetched {len(rows)} rows...')  
 
 def show_categories_grouped_by_trope(database: str = "tropes.db"):
-    with closing(sqlite3.connect(database)) as connection:
-        # Nota bene: A nice alternative to UNION ALL
-        select = """SELECT 
-                        member_id, 
-                        CASE WHEN tropes.title IS NULL THEN m.title ELSE tropes.title END AS member_title,
-                        GROUP_CONCAT(category_id || ':' || categories.title)
-                    FROM members
-                    INNER JOIN tropes ON tropes.id = member_id
-                    LEFT JOIN categories ON categories.id = category_id
-                    LEFT JOIN categories AS m ON m.id = member_id
-                    GROUP BY member_id;"""
-
-        cursor = connection.cursor()
-        cursor.execute(select)
-        rows = cursor.fetchall()
-        print(list(map(lambda x: x[0], cursor.description)))
-        for index, row in enumerate(rows):
-            print(row)          
-        print(f'Fetched {len(rows)} rows...')  
+    connection = _get_conn(database)
+    # Nota bene: A nice alternative to UNION ALL
+    select = """SELECT 
+                    member_id, 
+                    CASE WHEN tropes.title IS NULL THEN m.title ELSE tropes.title END AS member_title,
+                    GROUP_CONCAT(category_id || ':' || categories.title)
+                FROM members
+                INNER JOIN tropes ON tropes.id = member_id
+                LEFT JOIN categories ON categories.id = category_id
+                LEFT JOIN categories AS m ON m.id = member_id
+                GROUP BY member_id;"""
+
+    cursor = connection.cursor()
+    cursor.execute(select)
+    rows = cursor.fetchall()
+    print(list(map(lambda x: x[0], cursor.description)))
+    for index, row in enumerate(rows):
+        print(row)          
+    print(f'Fetched {len(rows)} rows...')  
 
 def show_members(database: str = "tropes.db"):
-    with closing(sqlite3.connect(database)) as connection:
-        select = """SELECT category_id, categories.title, member_id, tropes.title
-                    FROM members
-                    INNER JOIN tropes ON tropes.id = member_id
-                    INNER JOIN categories ON categories.id = category_id
-        
-                    UNION ALL
-                    
-                    SELECT category_id, categories.title, member_id, m.title
-                    FROM members
-                    INNER JOIN categories ON categories.id = category_id
-                    INNER JOIN categories AS m ON m.id = member_id
-                    
-                    ORDER BY category_id
-                    ;"""
-
-        cursor = connection.cursor()
-        cursor.execute(select)
-        rows = cursor.fetchall()
-        print(list(map(lambda x: x[0], cursor.description)))
-        for index, row in enumerate(rows):
-            print(row)          
-        print(f'Fetched {len(rows)} rows...')  
+    connection = _get_conn(database)
+    select = """SELECT category_id, categories.title, member_id, tropes.title
+                FROM members
+                INNER JOIN tropes ON tropes.id = member_id
+                INNER JOIN categories ON categories.id = category_id
+    
+                UNION ALL
+                
+                SELECT category_id, categories.title, member_id, m.title
+                FROM members
+                INNER JOIN categories ON categories.id = category_id
+                INNER JOIN categories AS m ON m.id = member_id
+                
+                ORDER BY category_id
+                ;"""
+
+    cursor = connection.cursor()
+    cursor.execute(select)
+    rows = cursor.fetchall()
+    print(list(map(lambda x: x[0], cursor.description)))
+    for index, row in enumerate(rows):
+        print(row)          
+    print(f'Fetched {len(rows)} rows...')  
 
 def show_categories_that_are_members(database: str = "tropes.db"):
-    with closing(sqlite3.connect(database)) as connection:
-        select = """SELECT DISTINCT member_id, m.title
-                    FROM members 
-                    INNER JOIN categories AS m ON m.id = member_id;"""
-
-        cursor = connection.cursor()
-        cursor.execute(select)
-        rows = cursor.fetchall()
-        print(list(map(lambda x: x[0], cursor.description)))
-        for index, row in enumerate(rows):
-            print(row)          
-        print(f'Fetched {len(rows)} rows...')  
+    connection = _get_conn(database)
+    select = """SELECT DISTINCT member_id, m.title
+                FROM members 
+                INNER JOIN categories AS m ON m.id = member_id;"""
+
+    cursor = connection.cursor()
+    cursor.execute(select)
+    rows = cursor.fetchall()
+    print(list(map(lambda x: x[0], cursor.description)))
+    for index, row in enumerate(rows):
+        print(row)          
+    print(f'Fetched {len(rows)} rows...')  
 
 def show_categories_grouped_by_category(database: str = "tropes.db"):
-    with closing(sqlite3.connect(database)) as connection:
-        select = """SELECT 
-                        member_id, m.title,
-                        GROUP_CONCAT(category_id || ':' || categories.title)
-                    FROM members
-                    INNER JOIN categories ON categories.id = category_id
-                    INNER JOIN categories AS m ON m.id = member_id
-                    GROUP BY member_id;"""
-
-        cursor = connection.cursor()
-        cursor.execute(select)
-        rows = cursor.fetchall()
-        print(list(map(lambda x: x[0], cursor.description)))
-        for index, row in enumerate(rows):
-            print(row)          
-        print(f'Fetched {len(rows)} rows...')  
+    connection = _get_conn(database)
+    select = """SELECT 
+                    member_id, m.title,
+                    GROUP_CONCAT(category_id || ':' || categories.title)
+                FROM members
+                INNER JOIN categories ON categories.id = category_id
+                INNER JOIN categories AS m ON m.id = member_id
+                GROUP BY member_id;"""
+
+    cursor = connection.cursor()
+    cursor.execute(select)
+    rows = cursor.fetchall()
+    print(list(map(lambda x: x[0], cursor.description)))
+    for index, row in enumerate(rows):
+        print(row)          
+    print(f'Fetched {len(rows)} rows...')  
 
 
 def show_hierachy(database: str = "tropes.db", limit: int = 100):
-    with closing(sqlite3.connect(database)) as connection:
-        
-        # we have a graph where any node can have 0,N children
-        # the leaves will have 0 children
-        # so we recurse up from the leaves AKA tropes in our case...
-        # this will fail for cyclic graphs...
-        # 1. purge the graph of cycles...
-        # 2. https://docs.python.org/2/library/sqlite3.html#sqlite3.Connection.create_function
-        #       since SQLite does not have a stored function/stored procedure language
-        # 3. limit recursion the moment a value repeats in any given path...
-
-        # the initial-select will be a row for each trope category i.e. the first edge
-        # the recursive-select will take each of these in turn and produce more
-        # each row is a unique path
-        # then need to limit the path...
-
-        recursive_select = f"""WITH RECURSIVE member_hierarchy AS (
-                            --- Start with the tropes...
-                            SELECT DISTINCT
-                                member_id,
-                                --- CASE WHEN tropes.title IS NULL THEN m.title ELSE tropes.title END AS member_title,
-                                tropes.title,
-                                category_id,
-                                --- c.title,
-                                c.title AS path
-                            FROM members
-                            INNER JOIN tropes ON tropes.id = member_id
-                            LEFT JOIN categories AS c ON c.id = category_id
-                            --- LEFT JOIN categories AS m ON m.id = member_id
-                            
-                            UNION --- ALL
-                            
-                            --- Move up ...
-                            SELECT DISTINCT
-                                members.member_id,
-                                m.title,
-                                members.category_id,
-                                --- c.title,
-                                c.title || '->' || member_hierarchy.path
-                            FROM members, member_hierarchy
-                            INNER JOIN categories AS c ON c.id = members.category_id
-                            INNER JOIN categories AS m ON m.id = members.member_id
-                            WHERE members.member_id = member_hierarchy.category_id
-                            
-                            LIMIT {limit}
-                            )
-                            SELECT *
-                            FROM member_hierarchy
-                            ORDER BY member_hierarchy.member_id;"""
-        cursor = connection.cursor()
-        cursor.execute(recursive_select)
-        rows = cursor.fetchall()
-        print(list(map(lambda x: x[0], cursor.description)))
-        for index, row in enumerate(rows):
-            print(row)          
-        print(f'Fetched {len(rows)} rows...')  
+    connection = _get_conn(database)
+    
+    # we have a graph where any node can have 0,N children
+    # the leaves will have 0 children
+    # so we recurse up from the leaves AKA tropes in our case...
+    # this will fail for cyclic graphs...
+    # 1. purge the graph of cycles...
+    # 2. https://docs.python.org/2/library/sqlite3.html#sqlite3.Connection.create_function
+    #       since SQLite does not have a stored function/stored procedure language
+    # 3. limit recursion the moment a value repeats in any given path...
+
+    # the initial-select will be a row for each trope category i.e. the first edge
+    # the recursive-select will take each of these in turn and produce more
+    # each row is a unique path
+    # then need to limit the path...
+
+    recursive_select = f"""WITH RECURSIVE member_hierarchy AS (
+                        --- Start with the tropes...
+                        SELECT DISTINCT
+                            member_id,
+                            --- CASE WHEN tropes.title IS NULL THEN m.title ELSE tropes.title END AS member_title,
+                            tropes.title,
+                            category_id,
+                            --- c.title,
+                            c.title AS path
+                        FROM members
+                        INNER JOIN tropes ON tropes.id = member_id
+                        LEFT JOIN categories AS c ON c.id = category_id
+                        --- LEFT JOIN categories AS m ON m.id = member_id
+                        
+                        UNION --- ALL
+                        
+                        --- Move up ...
+                        SELECT DISTINCT
+                            members.member_id,
+                            m.title,
+                            members.category_id,
+                            --- c.title,
+                            c.title || '->' || member_hierarchy.path
+                        FROM members, member_hierarchy
+                        INNER JOIN categories AS c ON c.id = members.category_id
+                        INNER JOIN categories AS m ON m.id = members.member_id
+                        WHERE members.member_id = member_hierarchy.category_id
+                        
+                        LIMIT {limit}
+                        )
+                        SELECT *
+                        FROM member_hierarchy
+                        ORDER BY member_hierarchy.member_id;"""
+    cursor = connection.cursor()
+    cursor.execute(recursive_select)
+    rows = cursor.fetchall()
+    print(list(map(lambda x: x[0], cursor.description)))
+    for index, row in enumerate(rows):
+        print(row)          
+    print(f'Fetched {len(rows)} rows...')  
 
 def show_hierachy2(database: str = "tropes.db", limit: int = 100, min_members: int = 10):
     
@@ -425,73 +700,86 @@ def show_hierachy2(database: str = "tropes.db", limit: int = 100, min_members: i
 
 
 
-    with closing(sqlite3.connect(database)) as connection:    
-        recursive_select = f"""WITH RECURSIVE member_hierarchy AS (
-                            --- Start with the categories that are not members...
-                            --- and have more than min_members themselves...
-                            SELECT
-                                1 AS iter,
-                                NULL AS category_id,
-                                NULL AS category_title,
-                                id AS member_id,
-                                title AS path
-                            FROM categories ---AS initial_select
-                            --- Performance is fine if we have only a few top-level categories,
-                            --- which we influence with min_members...
-                            WHERE NOT EXISTS (SELECT 1 FROM members WHERE members.member_id = categories.id)
-                            AND (
-                                SELECT COUNT(1) 
-                                FROM members
-                                ---INNER JOIN tropes ON tropes.id = members.member_id
-                                WHERE members.category_id = categories.id
-                            ) > {min_members}
-                                                        
-                            --- UNION ALL is fine here and is quicker than UNION which filters...
-                            UNION ALL
-                            
-                            --- Move down the categories ...
-                            SELECT
-                                member_hierarchy.iter + 1 AS iter,
-                                members.category_id AS category_id,
-                                c.title,
-                                members.member_id AS member_id,
-                                member_hierarchy.path || '->' || m.title AS path
-                            FROM members, member_hierarchy
-                            INNER JOIN categories AS c ON c.id = members.category_id
-                            INNER JOIN categories AS m ON m.id = members.member_id
-                            WHERE members.category_id = member_hierarchy.member_id 
-                            
-                            UNION ALL
-
-                            --- Move down the tropes ...
-                            SELECT
-                                member_hierarchy.iter + 1 AS iter,
-                                members.category_id AS category_id,
-                                c.title,
-                                members.member_id AS member_id,
-                                member_hierarchy.path || '=>' || m.title AS path
-                            FROM members, member_hierarchy
-                            INNER JOIN tropes AS m ON m.id = members.member_id
-                            INNER JOIN categories AS c ON c.id = members.category_id
-                            WHERE members.category_id = member_hierarchy.member_id 
-
-                            LIMIT {limit}
-                            )
-
-                            --- We had to build the entire member_hierarchy but only care about the tropes...
-                            SELECT member_hierarchy.*
-                            FROM member_hierarchy
-                            ---INNER JOIN tropes ON tropes.id = member_hierarchy.member_id
-                            ---ORDER BY member_id
-                            ---ORDER BY member_hierarchy.member_id
-                            ;"""
-        cursor = connection.cursor()
-        cursor.execute(recursive_select)
-        rows = cursor.fetchall()
-        print(list(map(lambda x: x[0], cursor.description)))
-        for index, row in enumerate(rows):
-            print(row)          
-        print(f'Fetched {len(rows)} rows...')  
+    # Nota bene: The old recursive-select dragged a growing path string through
+    # every arm (O(depth^2) in bytes inside the CTE) and the `FROM members,
+    # member_hierarchy` comma join left SQLite to prune the cross product
+    # itself. Now the CTE only walks DISTINCT (category_id, member_id) edges
+    # with an explicit join on the frontier (an index-seek on the members
+    # primary key), and the path strings are rebuilt in Python afterwards...
+
+    connection = _get_conn(database)
+    recursive_select = f"""WITH RECURSIVE member_hierarchy AS (
+                        --- Start with the categories that are not members...
+                        --- and have more than min_members themselves...
+                        --- Nota bene: No depth column -- it would defeat the
+                        --- UNION dedup for edges reachable at several depths
+                        --- (diamonds), and nothing downstream needs it...
+                        SELECT
+                            NULL AS category_id,
+                            id AS member_id
+                        FROM categories ---AS initial_select
+                        --- Performance is fine if we have only a few top-level categories,
+                        --- which we influence with min_members...
+                        WHERE NOT EXISTS (SELECT 1 FROM members WHERE members.member_id = categories.id)
+                        AND (
+                            SELECT COUNT(1)
+                            FROM members
+                            WHERE members.category_id = categories.id
+                        ) > {min_members}
+
+                        --- UNION dedups the edges, so revisiting a category via
+                        --- another parent no longer multiplies the rows...
+                        UNION
+
+                        --- Move down one edge from the frontier...
+                        SELECT
+                            members.category_id AS category_id,
+                            members.member_id AS member_id
+                        FROM member_hierarchy AS mh
+                        INNER JOIN members ON members.category_id = mh.member_id
+
+                        LIMIT {limit}
+                        )
+
+                        SELECT
+                            mh.category_id,
+                            mh.member_id,
+                            CASE WHEN t.title IS NULL THEN m.title ELSE t.title END AS member_title,
+                            t.id IS NOT NULL AS is_trope
+                        FROM member_hierarchy AS mh
+                        LEFT JOIN tropes AS t ON t.id = mh.member_id
+                        LEFT JOIN categories AS m ON m.id = mh.member_id
+                        ;"""
+    cursor = connection.cursor()
+    cursor.execute(recursive_select)
+    rows = cursor.fetchall()
+    print(list(map(lambda x: x[0], cursor.description)))
+
+    # Rebuild the paths from the edges; carrying the ids along the path also
+    # guards against cycles without relying on LIMIT alone...
+    children: Dict[int, List[int]] = {}
+    roots: List[int] = []
+    member_titles: Dict[int, str] = {}
+    is_trope: Dict[int, bool] = {}
+    for (category_id, member_id, member_title, trope) in rows:
+        member_titles[member_id] = member_title
+        is_trope[member_id] = bool(trope)
+        if category_id == None:
+            roots.append(member_id)
+        else:
+            children.setdefault(category_id, []).append(member_id)
+
+    def walk(member_id: int, path: str, path_ids: Tuple[int, ...]):
+        print((member_id, member_titles[member_id], path))
+        for child in children.get(member_id, []):
+            if child in path_ids:
+                continue
+            separator = '=>' if is_trope[child] else '->'
+            walk(child, path + separator + member_titles[child], path_ids + (child,))
+
+    for root in roots:
+        walk(root, member_titles[root], (root,))
+    print(f'Fetched {len(rows)} edges...')
 
 # Rather than build the members table, each batch could be flattened as it is obtained from 
 # the server. We would like to move up the hierarchy matching on the last id associated with
@@ -527,12 +815,202 @@ def show_hierachy2(database: str = "tropes.db", limit: int = 100, min_members: i
 #         t1 = time.time()
 #         print(f"...took {t1-t0:.2f}s")
 
+# Network fetch and SQLite commit used to serialize in one thread; run the
+# generator in a producer thread behind a bounded queue so batch N+1 is being
+# fetched while batch N is being committed. maxsize caps memory at two
+# batches, and a producer exception is re-raised on the consumer side...
+def _pipelined(batches: Iterable[Batch], maxsize: int = 2) -> Generator[Batch, None, None]:
+    q: queue.Queue = queue.Queue(maxsize=maxsize)
+
+    def produce():
+        try:
+            for batch in batches:
+                q.put(batch)
+            q.put(None)
+        except Exception as e:
+            q.put(e)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while (batch := q.get()) != None:
+        if isinstance(batch, Exception):
+            raise batch
+        yield batch
+
 def get_category_members2(category: str ='Trope', gcmlimit: int = 100, cllimit: int = 20, max_members: int = None):
-    try: 
+    try:
+        t0 = time.time()
+        with closing(_open_db()) as connection:
+            bulk_load_category_members(_pipelined(category_members(category=category, gcmlimit=gcmlimit, cllimit=cllimit, max_members=max_members)), connection)
+    except Exception as e:
+        print(traceback.format_exc())
+    else:
+        print('bazinga!')
+    finally:
+        _SESSION.close()
+        t1 = time.time()
+        print(f"...took {t1-t0:.2f}s")
+
+# The crawl is thousands of independent HTTP calls; an event loop keeps many
+# more of them in flight on a single thread than the 8-worker pool, with no
+# thread overhead. The async path below mirrors the sync one and shares the
+# _seen_titles fast path and the persistent category_page cache; the sync path
+# stays for incremental use and the REPL helpers...
+
+async def _fetch(session: aiohttp.ClientSession, url: str) -> Dict[str, Any]:
+    async with session.get(url) as response:
+        return await response.json(loads=orjson.loads)
+
+async def category_page_async(session: aiohttp.ClientSession,
+            category: str,
+            scheme: str = 'https',
+            net_loc: str = 'allthetropes.org',
+            path: str = 'w/api.php/') -> Optional[Page]:
+
+    if category in _seen_titles:
+        return _seen_titles[category]
+
+    # The persistent category_page_cache answers warm restarts without HTTP
+    # on this path too; lookup never calls through, so the loop stays async...
+    hit, page = category_page.lookup(category, scheme=scheme, net_loc=net_loc, path=path)
+    if hit:
+        _seen_titles[category] = page
+        return page
+
+    query_params = {
+        'action': 'query',
+        'format': 'json',
+        'formatversion': 2, # returns a list
+        'generator': 'allcategories',
+        'gacfrom': category,
+        'gacto': category,
+        'maxlag': 1
+    }
+
+    url = f'{scheme}://{net_loc}/{path}?{urlencode(query_params)}'
+    payload = await _fetch(session, url)
+    # Nota bene: As in category_page, an 'error' body must not become a None
+    # in _seen_titles or a NULL tombstone in the shared persistent cache...
+    if (error := payload.get('error', None)) != None:
+        raise RuntimeError(f"category_page_async('{category}'): {error}")
+    if ((query := payload.get('query', None)) != None and
+        (pages := query.get('pages', None)) != None and
+        (page := (pages[0] if len(pages) == 1 else None)) != None and
+        (page.get('missing', None)) == None):
+        result = (page['pageid'], page['title'])
+    else:
+        result = None
+    _seen_titles[category] = result
+    # Nota bene: seed is a quick local sqlite insert, so it is tolerable on the
+    # loop; it keeps the persistent cache shared with the sync path warm...
+    category_page.seed(result, category, scheme=scheme, net_loc=net_loc, path=path)
+    return result
+
+async def category_members_async(session: aiohttp.ClientSession,
+                     category: str,
+                     max_members: int = None,
+                     gcmlimit: int = 50,
+                     cllimit: int = 20,
+                     scheme: str = 'https',
+                     net_loc: str = 'allthetropes.org',
+                     path: str = 'w/api.php/'):
+
+    if max_members != None and max_members <= 0:
+        max_members = None
+
+    gcmlimit = max(10, min(gcmlimit, 500))
+    cllimit = max(10, min(cllimit, 500))
+
+    query_params = {
+        'action': 'query',
+        'format': 'json',
+        'formatversion': 2, # returns a list
+        'generator': 'categorymembers',
+        'gcmtitle': f'Category:{category}',
+        'gcmlimit': gcmlimit, # 'max', # or 1 - 500
+        'gcmtype': 'subcat|page',
+        'prop': 'categories', # limit the result with clcategories=Category:Ending Tropes|Category:Tropes|Category:Twist Ending
+        'clshow': '!hidden', # Site Maintenance categories are hidden, so filter them in the MediaWiki SQL layer...
+        'cllimit': cllimit,
+        'maxlag': 1
+    }
+
+    num_members = 0
+
+    trope_ids = array('q')
+    category_ids = array('q')
+    membership_category_ids = array('q')
+    membership_member_ids = array('q')
+    batch_ids = set()
+
+    base_url = f'{scheme}://{net_loc}/{path}?{urlencode(query_params)}'
+    continue_params: Dict[str, Any] = {}
+
+    while max_members == None or num_members < max_members:
+        url = base_url + '&' + urlencode(continue_params) if continue_params else base_url
+        payload = await _fetch(session, url)
+        if ((query := payload.get('query', None)) != None and
+            (pages := query.get('pages', None)) != None):
+            for page in pages:
+                pageid = page['pageid']
+                title = page['title']
+                if title.startswith(_PREFIX):
+                    stripped = title[_PREFIX_LEN:]
+                    category_page.seed((pageid, title), stripped,
+                                       scheme=scheme, net_loc=net_loc, path=path)
+                    _seen_titles[stripped] = (pageid, title)
+                    category_ids.append(pageid)
+                    _titles[pageid] = stripped
+                else:
+                    trope_ids.append(pageid)
+                    _titles[pageid] = title
+                batch_ids.add(pageid)
+                category_titles = [t[_PREFIX_LEN:] if t.startswith(_PREFIX) else t
+                                   for t in (category['title'] for category in page.get('categories', []))]
+                # The known titles resolve inline; the rest overlap on the loop...
+                categories = {_seen_titles[t] for t in category_titles if t in _seen_titles}
+                unknown = [t for t in category_titles if t not in _seen_titles]
+                categories.update(await asyncio.gather(
+                    *(category_page_async(session, t, scheme=scheme, net_loc=net_loc, path=path) for t in unknown)))
+                categories.discard(None)
+                for (category_id, category_title) in categories:
+                    category_ids.append(category_id)
+                    _titles[category_id] = category_title[_PREFIX_LEN:] if category_title.startswith(_PREFIX) else category_title
+                    membership_category_ids.append(category_id)
+                    membership_member_ids.append(pageid)
+        else:
+            print(payload)
+        if payload.get('batchcomplete', None) == True:
+            num_members += len(batch_ids)
+            print(f'batchcomplete...{len(batch_ids)} members of {num_members} total')
+            yield (trope_ids, category_ids, membership_category_ids, membership_member_ids)
+            trope_ids = array('q')
+            category_ids = array('q')
+            membership_category_ids = array('q')
+            membership_member_ids = array('q')
+            batch_ids.clear()
+
+        if (continue_value := payload.get('continue', None)) == None:
+            return
+
+        print(f'continue...{len(batch_ids)} members {continue_value}')
+        continue_params = continue_value
+
+async def _crawl(category: str, gcmlimit: int, cllimit: int, max_members: int):
+    loop = asyncio.get_running_loop()
+    # The connector limit bounds in-flight requests the way a Semaphore would...
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=16),
+                                     headers={'User-Agent': 'tropes_galore/1.0', 'Accept-Encoding': 'gzip'}) as session:
+        # run_in_executor commits from a worker thread, so the connection must
+        # not be pinned to the loop's thread...
+        with closing(_open_db(check_same_thread=False)) as connection:
+            async for batch in category_members_async(session, category, gcmlimit=gcmlimit, cllimit=cllimit, max_members=max_members):
+                # Commit in the default executor so the loop keeps fetching...
+                await loop.run_in_executor(None, upsert_category_members, batch, connection)
+
+def get_category_members3(category: str ='Trope', gcmlimit: int = 100, cllimit: int = 20, max_members: int = None):
+    try:
         t0 = time.time()
-        for members in category_members(category=category, exclude_pages=site_maintenance_pages(), gcmlimit=gcmlimit, cllimit=cllimit, max_members=max_members):
-            print(f"category_members returned {len(members)} members.")
-            upsert_category_members(members)
+        asyncio.run(_crawl(category, gcmlimit, cllimit, max_members))
     except Exception as e:
         print(traceback.format_exc())
     else: